@@ -10,17 +10,45 @@ Inputs:
 
 Output:
     plaintext report printed to console and saved to portfolio_risk_report.txt
+    cleaned portfolio cached under .cache/ next to this script to speed up reruns on unchanged inputs
 """
 
 import pandas as pd
 import numpy as np
+import glob
+import hashlib
+import os
 import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+# only the position columns the report reads; the rest are skipped at parse time
+# explicit dtypes let the parser skip type inference; counts are floats so blank or fractional cells still parse
+POSITION_DTYPES = {
+    'ticker': str,
+    'name': str,
+    'country': str,
+    'currency': str,
+    'sector': str,
+    'side': str,
+    'beta': 'float64',
+    'avg_daily_volume': 'float64',
+    'posn_shares': 'float64',
+    'cost_basis_local': 'float64',
+    'market_price_local': 'float64',
+}
+FX_DTYPES = {'currency': str, 'to_USD': 'float64'}
+
+# the cleaned portfolio is cached next to this script, keyed on the contents of the input
+# files and this script plus the pandas/numpy versions; only the latest entry is kept.
+# the cache is unpickled, so it is trusted input
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+
 def load_data(positions_file, fx_file):
     """Load portfolio positions and FX rates"""
-    portfolio = pd.read_csv(positions_file)
-    fx_rates = pd.read_csv(fx_file)
+    portfolio = pd.read_csv(positions_file, usecols=list(POSITION_DTYPES), dtype=POSITION_DTYPES)
+    fx_rates = pd.read_csv(fx_file, dtype=FX_DTYPES)
     
     # removes unnamed columns if any
     fx_rates = fx_rates[[col for col in fx_rates.columns if 'Unnamed' not in col]]
@@ -29,9 +57,6 @@ def load_data(positions_file, fx_file):
 
 
 def clean_data(portfolio, fx_rates):    
-    # merge fx rates into portfolio df
-    portfolio = portfolio.merge(fx_rates, on='currency', how='left')
-    
     # there are some missing currency codes, fill based on country
     currency_map = {
         'AUS': 'AUD',
@@ -51,36 +76,186 @@ def clean_data(portfolio, fx_rates):
         'BRA': 'BRL'
     }
     
-    for idx, row in portfolio[portfolio['currency'].isna()].iterrows():
-        if row['country'] in currency_map:
-            portfolio.at[idx, 'currency'] = currency_map[row['country']]
+    portfolio = portfolio.copy()
+    cmap = pd.Series(currency_map)
+    # only the rows missing a currency need the country lookup
+    na = portfolio['currency'].isna()
+    portfolio.loc[na, 'currency'] = portfolio.loc[na, 'country'].map(cmap)
     
-    # merge FX rates for filled currencies
-    portfolio = portfolio.drop(columns=['to_USD'], errors='ignore')
-    portfolio = portfolio.merge(fx_rates, on='currency', how='left')
+    # look up each distinct currency's FX rate once and broadcast it via the category codes
+    portfolio['currency'] = portfolio['currency'].astype('category')
+    fx_series = fx_rates.set_index('currency')['to_USD']
+    rates = fx_series.reindex(portfolio['currency'].cat.categories).to_numpy()
+    # a trailing NaN means code -1 (no currency) looks up NaN, even with no categories at all
+    codes = portfolio['currency'].cat.codes.to_numpy()
+    portfolio['to_USD'] = np.append(rates, np.nan)[codes]
     
-    # calculate position values
-    portfolio['position_value_local'] = portfolio['posn_shares'] * portfolio['market_price_local']
-    portfolio['cost_value_local'] = portfolio['posn_shares'] * portfolio['cost_basis_local']
-    portfolio['unrealized_pnl_local'] = portfolio['position_value_local'] - portfolio['cost_value_local']
+    # calculate USD position values and P&L in one numpy pass
+    shares = portfolio['posn_shares'].to_numpy(dtype=float)
+    mp = portfolio['market_price_local'].to_numpy(dtype=float)
+    cb = portfolio['cost_basis_local'].to_numpy(dtype=float)
+    fx = portfolio['to_USD'].to_numpy(dtype=float)
     
-    # convert to USD
-    portfolio['position_value_usd'] = portfolio['position_value_local'] * portfolio['to_USD']
-    portfolio['cost_value_usd'] = portfolio['cost_value_local'] * portfolio['to_USD']
-    portfolio['unrealized_pnl_usd'] = portfolio['unrealized_pnl_local'] * portfolio['to_USD']
+    pv_usd = shares * mp * fx
+    portfolio[['position_value_usd', 'unrealized_pnl_usd', 'abs_position_value_usd']] = np.column_stack(
+        [pv_usd, shares * (mp - cb) * fx, np.abs(pv_usd)]
+    )
     
     # Calculate portfolio weights
-    total_gmv = portfolio['position_value_usd'].abs().sum()
-    portfolio['position_weight'] = portfolio['position_value_usd'] / total_gmv
-    portfolio['dollar_weight'] = portfolio['position_value_usd'].abs() / total_gmv
+    total_gmv = portfolio['abs_position_value_usd'].sum()
+    portfolio['dollar_weight'] = portfolio['abs_position_value_usd'] / total_gmv
     
     # Calculate days to unwind (we assume max 10% daily value can be traded per day)
     portfolio['days_to_unwind'] = (portfolio['posn_shares'].abs() / 
                                     (portfolio['avg_daily_volume'] * 0.10))
 
+    # low-cardinality labels used for masks and groupby keys
+    for col in ('side', 'country', 'sector'):
+        portfolio[col] = portfolio[col].astype('category')
+
     return portfolio, total_gmv
 
 
+def cache_path(positions_file, fx_file):
+    """Cache file for the cleaned portfolio, keyed on the input files, report code and library versions"""
+    key = hashlib.sha1(f"pandas={pd.__version__};numpy={np.__version__};".encode())
+    # hash contents rather than mtime/size: a same-size rewrite within the filesystem's
+    # timestamp resolution must not serve a stale report, and hashing these files is cheap
+    for path in (positions_file, fx_file, __file__):
+        with open(path, 'rb') as f:
+            key.update(hashlib.sha1(f.read()).digest())
+    return os.path.join(CACHE_DIR, f"portfolio_{key.hexdigest()[:16]}.pkl")
+
+
+def load_clean_portfolio(positions_file, fx_file):
+    """Load and clean the portfolio, reusing the cached result if the inputs are unchanged"""
+    path = cache_path(positions_file, fx_file)
+    
+    # a bad cache read should never stop the report either; drop the file and rebuild
+    if os.path.exists(path):
+        try:
+            portfolio, total_gmv = pd.read_pickle(path)
+            return portfolio, total_gmv
+        except Exception:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    
+    portfolio, fx_rates = load_data(positions_file, fx_file)
+    portfolio, total_gmv = clean_data(portfolio, fx_rates)
+    
+    # a failed cache write should never stop the report; write to a temp file and
+    # rename it so an interrupted write never leaves a partial cache behind
+    tmp_path = None
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+        os.close(fd)
+        pd.to_pickle((portfolio, total_gmv), tmp_path)
+        os.replace(tmp_path, path)
+    except OSError:
+        if tmp_path is not None:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        return portfolio, total_gmv
+    
+    # keep only the entry just written so the cache does not grow with every new input
+    stale = glob.glob(os.path.join(CACHE_DIR, 'portfolio_*.pkl')) + glob.glob(os.path.join(CACHE_DIR, '*.tmp'))
+    for stale_path in stale:
+        if stale_path != path:
+            try:
+                os.remove(stale_path)
+            except OSError:
+                pass
+    
+    return portfolio, total_gmv
+
+
+def precompute_arrays(portfolio):
+    """Cache side masks and value arrays shared by the report sections"""
+    long_mask = (portfolio['side'] == 'LONG').to_numpy()
+    short_mask = (portfolio['side'] == 'SHORT').to_numpy()
+    
+    # missing values count as zero, matching the skipna behaviour of pandas sums
+    arrays = {
+        'long_mask': long_mask,
+        'short_mask': short_mask,
+        'pv': np.nan_to_num(portfolio['position_value_usd'].to_numpy()),
+        'abs_pv': np.nan_to_num(portfolio['abs_position_value_usd'].to_numpy()),
+        'beta': np.nan_to_num(portfolio['beta'].to_numpy()),
+        'pnl': np.nan_to_num(portfolio['unrealized_pnl_usd'].to_numpy()),
+    }
+    return arrays
+
+
+def portfolio_stats(total_gmv, arrays):
+    """Compute the portfolio-level totals once for every section to share"""
+    pv = arrays['pv']
+    beta = arrays['beta']
+    long_mask = arrays['long_mask']
+    short_mask = arrays['short_mask']
+    
+    stats = {
+        'gmv': total_gmv,
+        'net_value': pv.sum(),
+        'total_pnl': arrays['pnl'].sum(),
+        'long_value': float(np.sum(pv, where=pv > 0)),
+        'short_value': float(np.sum(pv, where=pv < 0)),
+        'n_long': int(long_mask.sum()),
+        'n_short': int(short_mask.sum()),
+        # beta-weighted dollars as single dot products, no temporaries
+        'beta_dollars': np.dot(beta, pv),
+        'long_beta_dollars': np.dot(beta[long_mask], pv[long_mask]),
+        'short_beta_dollars': np.dot(beta[short_mask], pv[short_mask]),
+    }
+    return stats
+
+
+def exposure_breakdowns(portfolio, arrays):
+    """Aggregate net/gross exposure and P&L by sector, country and currency"""
+    breakdowns = {}
+    for key in ('sector', 'country', 'currency'):
+        # grouped sums straight off the category codes; like groupby, rows with a
+        # missing label are dropped
+        labels = portfolio[key].cat
+        codes = labels.codes.to_numpy()
+        valid = codes >= 0
+        codes = codes[valid]
+        n_groups = len(labels.categories)
+        
+        observed = np.bincount(codes, minlength=n_groups) > 0
+        breakdowns[key] = pd.DataFrame(
+            {
+                'Net_Exposure_USD': np.bincount(codes, weights=arrays['pv'][valid], minlength=n_groups),
+                'Gross_Exposure_USD': np.bincount(codes, weights=arrays['abs_pv'][valid], minlength=n_groups),
+                'Unrealized_PnL': np.bincount(codes, weights=arrays['pnl'][valid], minlength=n_groups),
+            },
+            index=pd.Index(labels.categories, name=key),
+        )[observed]
+    return breakdowns
+
+
+def top_k_indices(values, k):
+    """Row positions of the k largest values, largest first, ties in row order like nlargest"""
+    values = np.asarray(values)
+    nan_rows = np.flatnonzero(np.isnan(values))
+    n_ranked = min(k, len(values) - len(nan_rows))
+    if n_ranked == 0:
+        return nan_rows[:k]
+    
+    # partial partition is O(n) and finds the k-th largest value (NaNs sort last)
+    kth = -np.partition(-values, n_ranked - 1)[n_ranked - 1]
+    # keep everything above it, then fill up with the earliest rows tied at it
+    above = np.flatnonzero(values > kth)
+    tied = np.flatnonzero(values == kth)[:k - len(above)]
+    idx = np.sort(np.concatenate([above, tied]))
+    # like nlargest, NaN rows only come in once the real values run out
+    return np.concatenate([idx[np.argsort(-values[idx], kind='stable')], nan_rows[:k - len(idx)]])
+
+
 def generate_report_header():
     """Generate report header with timestamp"""
     now = datetime.now()
@@ -93,33 +268,33 @@ Report Generated: {now.strftime('%Y-%m-%d %H:%M:%S')}
     return header
 
 
-def portfolio_summary_section(portfolio, total_gmv):
+def portfolio_summary_section(portfolio, stats):
     """Generate portfolio summary statistics"""
-    
-    long_value = portfolio[portfolio['position_value_usd'] > 0]['position_value_usd'].sum()
-    short_value = portfolio[portfolio['position_value_usd'] < 0]['position_value_usd'].sum()
-    net_value = portfolio['position_value_usd'].sum()
-    total_pnl = portfolio['unrealized_pnl_usd'].sum()
-
+    total_gmv = stats['gmv']
+    long_value = stats['long_value']
+    short_value = stats['short_value']
+    net_value = stats['net_value']
+    total_pnl = stats['total_pnl']
+    n_long = stats['n_long']
+    n_short = stats['n_short']
+
+    # shock P&L only matters in aggregate, so reduce it to a scalar without a column
     market_shock = 0.02
-    portfolio['shock_pnl'] = (portfolio['beta'] * market_shock * portfolio['position_value_usd'])
-    simulated_loss = portfolio['shock_pnl'].sum()
-    simulated_loss_pct = portfolio['shock_pnl'].sum() / total_gmv
+    simulated_loss = market_shock * stats['beta_dollars']
+    simulated_loss_pct = simulated_loss / total_gmv
 
-    weighted_beta = (portfolio['beta'] * portfolio['position_value_usd']).sum() / total_gmv
-    long_beta = (portfolio[portfolio['side'] == 'LONG']['beta'] * 
-                 portfolio[portfolio['side'] == 'LONG']['position_value_usd']).sum() / total_gmv
-    short_beta = (portfolio[portfolio['side'] == 'SHORT']['beta'] * 
-                  portfolio[portfolio['side'] == 'SHORT']['position_value_usd']).sum() / total_gmv
+    weighted_beta = stats['beta_dollars'] / total_gmv
+    long_beta = stats['long_beta_dollars'] / total_gmv
+    short_beta = stats['short_beta_dollars'] / total_gmv
 
     
     section = f"""
 PORTFOLIO SUMMARY
 {'-'*80}
 Total Positions:                       {len(portfolio)}
-Long Positions:                        {len(portfolio[portfolio['side'] == 'LONG'])}
-Short Positions:                       {len(portfolio[portfolio['side'] == 'SHORT'])}
-Long/Short Ratio:                      {len(portfolio[portfolio['side'] == 'LONG']) / max(len(portfolio[portfolio['side'] == 'SHORT']), 1):.2f}
+Long Positions:                        {n_long}
+Short Positions:                       {n_short}
+Long/Short Ratio:                      {n_long / max(n_short, 1):.2f}
 
 Total Gross Market Value (GMV):        ${total_gmv:,.2f}
 Total Long Exposure:                   ${long_value:,.2f}
@@ -145,59 +320,56 @@ Impact as % of GMV:                    {simulated_loss_pct:.4%}
     return section
 
 
-def concentration_analysis_section(portfolio):
+def concentration_analysis_section(portfolio, breakdowns, stats):
     """Analyze concentrations by various dimensions"""
-    gmv = portfolio['position_value_usd'].abs().sum()
+    gmv = stats['gmv']
 
     # Top positions by absolute value
-    top_positions = portfolio.nlargest(10, 'dollar_weight')[
+    top_idx = top_k_indices(portfolio['dollar_weight'].to_numpy(), 10)
+    top_positions = portfolio.iloc[top_idx][
         ['ticker', 'name', 'country', 'sector', 'position_value_usd', 'dollar_weight', 'side']
     ]
 
     # Sector concentrations
-    sector_exposure = portfolio.groupby('sector').agg(
-        Net_Exposure_USD=('position_value_usd', 'sum'),
-        Gross_Exposure_USD=('position_value_usd', lambda x: x.abs().sum()),
-        Unrealized_PnL=('unrealized_pnl_usd', 'sum')
-    )
+    sector_exposure = breakdowns['sector'].copy()
     sector_exposure['Pct_of_GMV'] = sector_exposure['Gross_Exposure_USD'] / gmv
-    sector_exposure = sector_exposure.round(2).sort_values('Pct_of_GMV', ascending=False, key=np.abs)
+    sector_exposure = sector_exposure.sort_values('Pct_of_GMV', ascending=False)
     # Reset index so the label (sector) prints as a normal column header in to_string
     sector_exposure_print = sector_exposure.reset_index()
 
     # Country concentrations
-    country_exposure = portfolio.groupby('country').agg(
-        Net_Exposure_USD=('position_value_usd', 'sum'),
-        Gross_Exposure_USD=('position_value_usd', lambda x: x.abs().sum()),
-        Unrealized_PnL=('unrealized_pnl_usd', 'sum')
-    ).round(2)
+    country_exposure = breakdowns['country'].copy()
     country_exposure['Pct_of_GMV'] = country_exposure['Gross_Exposure_USD'] / gmv
-    country_exposure = country_exposure.sort_values('Pct_of_GMV', ascending=False, key=np.abs)
+    country_exposure = country_exposure.sort_values('Pct_of_GMV', ascending=False)
     # Reset index so the label (country) prints inline with headers
     country_exposure_print = country_exposure.reset_index()
     
     # Currency exposures
-    currency_exposure = portfolio.groupby('currency').agg(
-        Net_Exposure_USD=('position_value_usd', 'sum'),
-        Gross_Exposure_USD=('position_value_usd', lambda x: x.abs().sum()),
-        Unrealized_PnL=('unrealized_pnl_usd', 'sum')
-    ).round(2)
+    currency_exposure = breakdowns['currency'].copy()
     currency_exposure['Pct_of_GMV'] = currency_exposure['Gross_Exposure_USD'] / gmv
-    currency_exposure = currency_exposure.sort_values('Pct_of_GMV', ascending=False, key=np.abs)
+    currency_exposure = currency_exposure.sort_values('Pct_of_GMV', ascending=False)
     currency_exposure_print = currency_exposure.reset_index()
     
+    # format at print time instead of rounding copies of each frame
+    exposure_formatters = {
+        'Net_Exposure_USD': '{:,.2f}'.format,
+        'Gross_Exposure_USD': '{:,.2f}'.format,
+        'Unrealized_PnL': '{:,.2f}'.format,
+        'Pct_of_GMV': '{:.4f}'.format,
+    }
+    
     section = f"""
 CONCENTRATION ANALYSIS
 {'-'*80}
 
 SECTOR EXPOSURE:
-{sector_exposure_print.to_string(index=False)}
+{sector_exposure_print.to_string(index=False, formatters=exposure_formatters)}
 
 COUNTRY EXPOSURE:
-{country_exposure_print.to_string(index=False)}
+{country_exposure_print.to_string(index=False, formatters=exposure_formatters)}
 
 CURRENCY EXPOSURE:
-{currency_exposure_print.to_string(index=False)}
+{currency_exposure_print.to_string(index=False, formatters=exposure_formatters)}
 
 TOP 10 POSITIONS BY SIZE:
 {top_positions.to_string(index=False)}
@@ -238,35 +410,36 @@ MOST ILLIQUID POSITIONS:
     
     return section
 
-def unintended_exposures_section(portfolio, total_gmv):
+def unintended_exposures_section(portfolio, breakdowns, stats):
     """Flag potential unintended exposures"""
+    total_gmv = stats['gmv']
     
     warnings = []
     
     # Check beta neutrality
-    weighted_beta = (portfolio['beta'] * portfolio['position_value_usd']).sum() / total_gmv
+    weighted_beta = stats['beta_dollars'] / total_gmv
     if abs(weighted_beta) > 0.1:
         warnings.append(f"⚠️  CRITICAL: Portfolio beta ({weighted_beta:.4f}) exceeds neutral threshold (±0.1)")
     
     # Check net exposure
-    net_exposure = portfolio['position_value_usd'].sum() / total_gmv
+    net_exposure = stats['net_value'] / total_gmv
     if abs(net_exposure) > 0.1:
         warnings.append(f"⚠️  Net market exposure ({net_exposure:.2%}) exceeds threshold (±10%)")
     
     # Check sector concentrations
-    sector_exposure = portfolio.groupby('sector')['position_value_usd'].sum().abs() / total_gmv
+    sector_exposure = breakdowns['sector']['Net_Exposure_USD'].abs() / total_gmv
     max_sector = sector_exposure.max()
     if max_sector > 0.3:
         warnings.append(f"Sector concentration ({max_sector:.2%}) in {sector_exposure.idxmax()}")
     
     # Check country concentrations
-    country_exposure = portfolio.groupby('country')['position_value_usd'].sum().abs() / total_gmv
+    country_exposure = breakdowns['country']['Net_Exposure_USD'].abs() / total_gmv
     max_country = country_exposure.max()
     if max_country > 0.3:
         warnings.append(f"Country concentration ({max_country:.2%}) in {country_exposure.idxmax()}")
 
     # Check currency concentrations
-    currency_exposure = portfolio.groupby('currency')['position_value_usd'].agg(lambda x: x.abs().sum()) / total_gmv
+    currency_exposure = breakdowns['currency']['Gross_Exposure_USD'] / total_gmv
     max_currency = currency_exposure.max()
     if max_currency > 0.3:
         warnings.append(f"High Currency concentration ({max_currency:.2%}) in {currency_exposure.idxmax()}")
@@ -283,20 +456,19 @@ def unintended_exposures_section(portfolio, total_gmv):
         warnings.append(f"{len(large_illiquid)} large positions require >10 days to unwind")
     
 
-    section = f"""
+    parts = [f"""
 UNINTENDED EXPOSURE WARNINGS
 {'-'*80}
-"""
+"""]
     
     if warnings:
-        for warning in warnings:
-            section += f"{warning}\n"
+        parts.extend(f"{warning}\n" for warning in warnings)
     else:
-        section += "✓ No significant unintended exposures detected\n"
+        parts.append("✓ No significant unintended exposures detected\n")
     
-    section += "\n"
+    parts.append("\n")
     
-    return section
+    return ''.join(parts)
 
 
 def generate_footer():
@@ -321,17 +493,24 @@ def main():
     fx_file = sys.argv[2]
     
     try:
-        portfolio, fx_rates = load_data(positions_file, fx_file)
-        
-        portfolio, total_gmv = clean_data(portfolio, fx_rates)
+        portfolio, total_gmv = load_clean_portfolio(positions_file, fx_file)
+        arrays = precompute_arrays(portfolio)
+        breakdowns = exposure_breakdowns(portfolio, arrays)
+        stats = portfolio_stats(total_gmv, arrays)
         
-        report = ""
-        report += generate_report_header()
-        report += unintended_exposures_section(portfolio, total_gmv)
-        report += portfolio_summary_section(portfolio, total_gmv)
-        report += concentration_analysis_section(portfolio)
-        report += liquidity_analysis_section(portfolio)
-        report += generate_footer()
+        # sections only read the cleaned data, so they can be built concurrently
+        sections = [
+            (unintended_exposures_section, (portfolio, breakdowns, stats)),
+            (portfolio_summary_section, (portfolio, stats)),
+            (concentration_analysis_section, (portfolio, breakdowns, stats)),
+            (liquidity_analysis_section, (portfolio,)),
+        ]
+        with ThreadPoolExecutor(max_workers=len(sections)) as executor:
+            futures = [executor.submit(fn, *args) for fn, args in sections]
+            parts = [generate_report_header()]
+            parts.extend(future.result() for future in futures)
+            parts.append(generate_footer())
+        report = ''.join(parts)
         
         print(report)
         
@@ -0,0 +1,65 @@
+"""
+Tests for portfolio_report helpers
+
+Run from this folder with:
+    python3 -m pytest test_portfolio_report.py
+"""
+
+import numpy as np
+import pandas as pd
+
+from portfolio_report import clean_data, exposure_breakdowns, precompute_arrays, top_k_indices
+
+
+def test_top_k_indices_matches_nlargest_with_ties():
+    """Ties are broken by row order, the same way nlargest(keep='first') does"""
+    rng = np.random.default_rng(0)
+    for _ in range(2000):
+        # few distinct values so the k-th place is usually tied
+        values = rng.integers(0, 8, size=50).astype(float)
+        k = int(rng.integers(1, 15))
+        expected = pd.Series(values).nlargest(k).index.to_numpy()
+        np.testing.assert_array_equal(top_k_indices(values, k), expected)
+
+
+def test_top_k_indices_short_input_and_nans():
+    """k larger than the data returns every non-NaN row, NaNs are never picked"""
+    values = np.array([1.0, np.nan, 3.0, 3.0])
+    expected = pd.Series(values).nlargest(10).index.to_numpy()
+    np.testing.assert_array_equal(top_k_indices(values, 10), expected)
+    assert len(top_k_indices(np.array([]), 10)) == 0
+
+
+def test_exposure_breakdowns_matches_groupby():
+    """bincount sums agree with groupby, with missing labels and missing values present"""
+    rng = np.random.default_rng(1)
+    n = 200
+    portfolio = pd.DataFrame({
+        'ticker': [f"T{i}" for i in range(n)],
+        'name': [f"equity_{i}" for i in range(n)],
+        'country': rng.choice(np.array(['USA', 'GBR', 'JPN', 'XXX', None], dtype=object), n),
+        'currency': rng.choice(np.array(['USD', 'GBP', 'JPY', None], dtype=object), n),
+        'sector': rng.choice(np.array(['Energy', 'Financials', 'Utilities', None], dtype=object), n),
+        'side': rng.choice(['LONG', 'SHORT'], n),
+        'beta': rng.normal(1.0, 0.5, n),
+        'avg_daily_volume': rng.integers(1, 10000, n).astype(float),
+        'posn_shares': rng.integers(-5000, 5000, n).astype(float),
+        'cost_basis_local': rng.uniform(10, 100, n),
+        'market_price_local': rng.uniform(10, 100, n),
+    })
+    # a blank share count gives a NaN position value, which groupby skips
+    portfolio.loc[::17, 'posn_shares'] = np.nan
+    fx_rates = pd.DataFrame({'currency': ['USD', 'GBP', 'JPY'], 'to_USD': [1.0, 1.3, 0.009]})
+
+    portfolio, _ = clean_data(portfolio, fx_rates)
+    breakdowns = exposure_breakdowns(portfolio, precompute_arrays(portfolio))
+    for key in ('sector', 'country', 'currency'):
+        # every dimension has rows with a missing label
+        assert portfolio[key].isna().any()
+        expected = portfolio.groupby(key, observed=True).agg(
+            Net_Exposure_USD=('position_value_usd', 'sum'),
+            Gross_Exposure_USD=('abs_position_value_usd', 'sum'),
+            Unrealized_PnL=('unrealized_pnl_usd', 'sum')
+        )
+        assert list(breakdowns[key].index) == list(expected.index)
+        np.testing.assert_allclose(breakdowns[key].to_numpy(), expected.to_numpy(), rtol=1e-12)